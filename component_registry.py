@@ -0,0 +1,221 @@
+# component_registry.py
+# 组件注册中心：各模块按需（懒加载）创建，三个大模型链路共享同一个带连接池的LLM客户端，
+# 同时记录每个模块的导入/初始化耗时，并支持在播放欢迎语时预热连接
+import asyncio
+import importlib
+import logging
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import (
+    NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD,
+    OPENAI_API_KEY, OPENAI_API_BASE,
+    LLM_MODEL_NAME, LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_KEEPALIVE_EXPIRY, LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT,
+)
+
+
+class ComponentRegistry:
+    def __init__(self):
+        self._factories: Dict[str, Callable[["ComponentRegistry"], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._timings: List[Tuple[str, str, float]] = []  # (阶段, 名称, 耗时秒)
+        self._lock = threading.Lock()
+        self._name_locks: Dict[str, threading.RLock] = {}
+        self._local = threading.local()  # 每个线程的嵌套计时栈，用于扣除嵌套的导入/初始化耗时
+        self._created_at = time.perf_counter()
+        self.logger = logging.getLogger(__name__)
+        self._register_defaults()
+
+    def register(self, name: str, factory: Callable[["ComponentRegistry"], Any]) -> None:
+        """注册组件工厂，工厂函数接收注册中心本身，便于获取依赖组件"""
+        self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        """获取组件，首次获取时才真正创建（按组件名加锁，不同组件可在不同线程并行创建）"""
+        if name in self._instances:
+            return self._instances[name]
+        with self._lock:
+            name_lock = self._name_locks.setdefault(name, threading.RLock())
+        with name_lock:
+            if name not in self._instances:
+                if name not in self._factories:
+                    raise KeyError(f"未注册的组件: {name}")
+                self._instances[name] = self._timed("init", name, lambda: self._factories[name](self))
+            return self._instances[name]
+
+    def is_created(self, name: str) -> bool:
+        return name in self._instances
+
+    def import_module(self, module_name: str):
+        """计时导入模块，已导入的模块不重复计时"""
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+        return self._timed("import", module_name, lambda: importlib.import_module(module_name))
+
+    def _timed(self, stage: str, name: str, fn: Callable[[], Any]) -> Any:
+        """
+        记录独占耗时：嵌套在其中的导入/初始化单独计时并从本项扣除，各项相加不会重复计算。
+        模块导入时顺带导入的依赖（如information_extraction导入langchain）计入该模块的导入耗时。
+        """
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)  # 嵌套项累计耗时
+        start = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            total = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += total
+            self._timings.append((stage, name, total - nested))
+
+    def _register_defaults(self):
+        self.register("http_client", _create_http_client)
+        self.register("http_async_client", _create_http_async_client)
+        self.register("llm", _create_llm)
+        self.register("llm_caller", _create_llm_caller)
+        self.register("neo4j_driver", _create_neo4j_driver)
+        self.register("profile_store", _create_profile_store)
+        self.register("extractor", _create_extractor)
+        self.register("question_analyzer", _create_question_analyzer)
+        self.register("response_generator", _create_response_generator)
+        self.register("connector", _create_connector)
+        self.register("retriever", _create_retriever)
+
+    async def warm_up(self, components: Tuple[str, ...] = ("extractor", "connector", "retriever"),
+                      userid: Optional[str] = None) -> None:
+        """预热：创建组件、建立数据库连接池并与大模型接口建立长连接，传入userid时预加载用户画像，失败不影响正常使用"""
+        loop = asyncio.get_running_loop()
+        for name in components:
+            # 初始化涉及磁盘导入，放到线程里执行，避免阻塞欢迎语播放
+            await loop.run_in_executor(None, self.get, name)
+
+        start = time.perf_counter()
+        try:
+            driver = self.get("neo4j_driver")
+            await loop.run_in_executor(None, driver.verify_connectivity)
+        except Exception as e:
+            self.logger.warning(f"数据库预热失败: {str(e)}")
+        self._timings.append(("warmup", "neo4j", time.perf_counter() - start))
+
+        if userid is not None:
+            start = time.perf_counter()
+            await loop.run_in_executor(None, self.get("profile_store").get, userid)
+            self._timings.append(("warmup", "profile", time.perf_counter() - start))
+
+        start = time.perf_counter()
+        try:
+            client = self.get("http_async_client")
+            await client.get(
+                f"{OPENAI_API_BASE.rstrip('/')}/models",
+                headers={"Authorization": f"Bearer {OPENAI_API_KEY}"}
+            )
+        except Exception as e:
+            self.logger.warning(f"大模型连接预热失败: {str(e)}")
+        self._timings.append(("warmup", "llm", time.perf_counter() - start))
+
+    def startup_report(self) -> str:
+        """按导入/初始化/预热分别列出启动耗时"""
+        lines = ["[启动耗时]"]
+        totals: Dict[str, float] = {}
+        for stage, name, cost in self._timings:
+            totals[stage] = totals.get(stage, 0.0) + cost
+            lines.append(f"  {stage:<7}{name:<28}{cost * 1000:8.1f} ms")
+        for stage, cost in totals.items():
+            lines.append(f"  {stage} 合计：{cost * 1000:.1f} ms")
+        lines.append(f"  总耗时：{(time.perf_counter() - self._created_at) * 1000:.1f} ms")
+        return "\n".join(lines)
+
+    async def aclose(self) -> None:
+        """释放连接池"""
+        if self.is_created("http_async_client"):
+            await self._instances["http_async_client"].aclose()
+        if self.is_created("http_client"):
+            self._instances["http_client"].close()
+        if self.is_created("neo4j_driver"):
+            self._instances["neo4j_driver"].close()
+
+
+# 默认组件工厂
+def _http_limits(registry: ComponentRegistry):
+    httpx = registry.import_module("httpx")
+    limits = httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+    )
+    timeout = httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+    return httpx, limits, timeout
+
+def _create_http_client(registry: ComponentRegistry):
+    httpx, limits, timeout = _http_limits(registry)
+    return httpx.Client(limits=limits, timeout=timeout)
+
+def _create_http_async_client(registry: ComponentRegistry):
+    httpx, limits, timeout = _http_limits(registry)
+    return httpx.AsyncClient(limits=limits, timeout=timeout)
+
+def _create_llm(registry: ComponentRegistry):
+    """共享的LLM客户端，各模块通过bind设置自己的temperature/max_tokens"""
+    langchain_openai = registry.import_module("langchain_openai")
+    return langchain_openai.ChatOpenAI(
+        model_name=LLM_MODEL_NAME,
+        openai_api_key=OPENAI_API_KEY,
+        openai_api_base=OPENAI_API_BASE,
+        http_client=registry.get("http_client"),
+        http_async_client=registry.get("http_async_client"),
+        max_retries=0  # 重试统一由ResilientCaller负责，避免在每次尝试/对冲请求内部重复重试
+    )
+
+def _create_llm_caller(registry: ComponentRegistry):
+    """共享的容错调用器，各阶段的熔断状态在所有模块间共用"""
+    module = registry.import_module("llm_resilience")
+    return module.ResilientCaller()
+
+def _create_neo4j_driver(registry: ComponentRegistry):
+    neo4j = registry.import_module("neo4j")
+    return neo4j.GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD))
+
+def _create_profile_store(registry: ComponentRegistry):
+    module = registry.import_module("user_profile")
+    return module.UserProfileStore(registry.get("neo4j_driver"))
+
+def _create_extractor(registry: ComponentRegistry):
+    module = registry.import_module("information_extraction")
+    return module.EntityRelationExtractor(
+        llm=registry.get("llm"),
+        caller=registry.get("llm_caller")
+    )
+
+def _create_question_analyzer(registry: ComponentRegistry):
+    module = registry.import_module("question_processing")
+    return module.QuestionAnalyzer(
+        llm=registry.get("llm"),
+        caller=registry.get("llm_caller")
+    )
+
+def _create_response_generator(registry: ComponentRegistry):
+    module = registry.import_module("response_generation")
+    return module.ResponseGenerator(
+        llm=registry.get("llm"),
+        caller=registry.get("llm_caller")
+    )
+
+def _create_connector(registry: ComponentRegistry):
+    module = registry.import_module("knowledge_graph_manager")
+    return module.EnhancedNeo4jConnector(
+        driver=registry.get("neo4j_driver"),
+        extractor=registry.get("extractor"),
+        profile_store=registry.get("profile_store")
+    )
+
+def _create_retriever(registry: ComponentRegistry):
+    module = registry.import_module("memory_retrieval")
+    return module.MemoryRetriever(
+        driver=registry.get("neo4j_driver"),
+        question_analyzer=registry.get("question_analyzer"),
+        response_generator=registry.get("response_generator"),
+        profile_store=registry.get("profile_store")
+    )
@@ -14,4 +14,24 @@ os.environ["NEO4J_URI"] = NEO4J_URI
 os.environ["NEO4J_USERNAME"] = NEO4J_USERNAME
 os.environ["NEO4J_PASSWORD"] = NEO4J_PASSWORD
 os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
-os.environ["OPENAI_API_BASE"] = OPENAI_API_BASE
\ No newline at end of file
+os.environ["OPENAI_API_BASE"] = OPENAI_API_BASE
+
+# 大模型客户端配置（所有模块共享同一个带连接池的客户端）
+LLM_MODEL_NAME = "deepseek-chat"
+LLM_MAX_CONNECTIONS = 20
+LLM_MAX_KEEPALIVE_CONNECTIONS = 10
+LLM_KEEPALIVE_EXPIRY = 60.0  # 空闲连接保活秒数
+LLM_CONNECT_TIMEOUT = 10.0
+LLM_READ_TIMEOUT = 60.0
+
+# 大模型调用容错配置（按阶段）：deadline为整体截止秒数（含重试），
+# hedge_after为发出对冲请求前的等待秒数（None表示不对冲）
+LLM_STAGE_POLICIES = {
+    "extraction": {"deadline": 8.0, "retries": 1, "hedge_after": None},
+    "analysis": {"deadline": 4.0, "retries": 1, "hedge_after": 1.5},
+    "response": {"deadline": 10.0, "retries": 1, "hedge_after": 4.0},
+}
+LLM_RETRY_BASE_DELAY = 0.2
+LLM_RETRY_MAX_DELAY = 1.0
+LLM_BREAKER_FAILURE_THRESHOLD = 3  # 连续失败多少次后熔断
+LLM_BREAKER_RESET_TIMEOUT = 30.0  # 熔断后多少秒允许试探请求
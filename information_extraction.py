@@ -1,11 +1,14 @@
 #Description:从用户对话中提取实体和关系，并转换为实体和关系类，也打算分析是否是问句
-from typing import List
+from collections import deque
+from typing import List, Optional, Tuple
 from pydantic import BaseModel, Field, ValidationError
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.exceptions import OutputParserException
 from langchain_core.runnables import RunnablePassthrough, RunnableLambda
 from langchain_openai import ChatOpenAI
-from config import OPENAI_API_KEY, OPENAI_API_BASE  # 导入配置
+from config import OPENAI_API_KEY, OPENAI_API_BASE, LLM_MODEL_NAME  # 导入配置
+from llm_resilience import CircuitOpen, ResilientCaller, StageUnavailable
 import os
 import time
 # import json
@@ -31,12 +34,23 @@ class KnowledgeGraph(BaseModel):
     entities: List[EntityNode]
     relations: List[RelationEdge]
 
+MAX_PENDING_TEXTS = 100  # 待补做抽取队列上限，超出时丢弃最早的
+MAX_PENDING_ATTEMPTS = 3  # 单条文本最多补做次数
+MAX_RETRY_PER_DRAIN = 5  # 每次补做最多处理的条数
+
+def _is_output_error(e: BaseException) -> bool:
+    """模型返回了无法解析的内容：属于确定性错误，重试和熔断都没有意义"""
+    return isinstance(e, OutputParserException)
+
 # 异步处理核心类
 class EntityRelationExtractor:
-    def __init__(self):
+    def __init__(self, llm=None, caller: Optional[ResilientCaller] = None):
         self.parser = JsonOutputParser(pydantic_object=KnowledgeGraph)
+        self.caller = caller or ResilientCaller()
+        # 大模型不可用时跳过的抽取：(文本, userid, 已尝试次数)
+        self.pending = deque(maxlen=MAX_PENDING_TEXTS)
         self._init_prompt_template()
-        self._init_llm_model()
+        self._init_llm_model(llm)
         self._build_async_chain()
 
     def _init_prompt_template(self):
@@ -99,13 +113,18 @@ class EntityRelationExtractor:
             ("human", "待分析文本：{input}")
         ])
 
-    def _init_llm_model(self):
+    def _init_llm_model(self, llm=None):
+        if llm is not None:
+            # 复用共享客户端（连接池），只绑定本模块的采样参数
+            self.model = llm.bind(temperature=0.3, max_tokens=1024)
+            return
         self.model = ChatOpenAI(
-            model_name="deepseek-chat",
+            model_name=LLM_MODEL_NAME,
             max_tokens=1024,
             temperature=0.3,
             openai_api_key=os.getenv("OPENAI_API_KEY"),
-            openai_api_base=os.getenv("OPENAI_API_BASE")
+            openai_api_base=os.getenv("OPENAI_API_BASE"),
+            max_retries=0  # 重试统一由ResilientCaller负责
         )
 
     def _build_async_chain(self):
@@ -137,20 +156,67 @@ class EntityRelationExtractor:
             print(f"响应清洗失败: {str(e)}")
             return '{"entities":[],"relations":[]}'
 
+    def _make_call(self, text: str, userid: str):
+        txt = f"此用户的userid是{userid}"
+        txt2 = txt+text
+        return lambda: self.chain.ainvoke({"input": txt2})
+
     async def extract(self, text: str, userid: str) -> KnowledgeGraph:
         """修复后的异步接口"""
         try:
             # start_time = time.time()
-            txt = f"此用户的userid是{userid}"
-            txt2 = txt+text
-            result = await self.chain.ainvoke({"input": txt2})
+            result = await self.caller.call(
+                "extraction", self._make_call(text, userid), non_retryable=_is_output_error
+            )
             # print(f"总处理时间: {time.time()-start_time:.2f}s")
             # print(result)
+        except StageUnavailable as e:
+            # 降级：跳过本轮抽取，放入队列稍后补做，不影响本轮回答
+            print(f"信息抽取暂不可用，已加入待处理队列: {str(e)}")
+            self.pending.append((text, userid, 0))
+            return KnowledgeGraph(entities=[], relations=[])
+        except OutputParserException as e:
+            print(f"模型输出解析失败: {str(e)}")
+            return KnowledgeGraph(entities=[], relations=[])
+        return self._to_graph(result)
+
+    def _to_graph(self, result) -> KnowledgeGraph:
+        """把解析结果转换为KnowledgeGraph，格式不对时返回空图"""
+        if not isinstance(result, dict):
+            print(f"格式校验失败: 期望JSON对象，实际为{type(result).__name__}")
+            return KnowledgeGraph(entities=[], relations=[])
+        try:
             return KnowledgeGraph(**result)
         except ValidationError as e:
             print(f"格式校验失败: {str(e)}")
             return KnowledgeGraph(entities=[], relations=[])
 
+    async def retry_pending(self, max_items: int = MAX_RETRY_PER_DRAIN) -> List[Tuple[str, KnowledgeGraph]]:
+        """补做之前跳过的抽取，每次最多max_items条，遇到失败立即停止，剩余文本继续排队"""
+        results = []
+        for _ in range(max_items):
+            if not self.pending:
+                break
+            text, userid, attempts = self.pending.popleft()
+            try:
+                result = await self.caller.call(
+                    "extraction", self._make_call(text, userid), non_retryable=_is_output_error
+                )
+            except CircuitOpen:
+                # 熔断中请求没有真正发出，不计入尝试次数
+                self.pending.appendleft((text, userid, attempts))
+                break
+            except StageUnavailable:
+                if attempts + 1 < MAX_PENDING_ATTEMPTS:
+                    self.pending.appendleft((text, userid, attempts + 1))
+                break
+            except OutputParserException as e:
+                # 输出无法解析，重做也不会变好，直接丢弃
+                print(f"模型输出解析失败: {str(e)}")
+                continue
+            results.append((userid, self._to_graph(result)))
+        return results
+
 # 异步主函数
 async def main():
     extractor = EntityRelationExtractor()
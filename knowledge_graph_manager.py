@@ -1,8 +1,9 @@
 # Description: 知识图谱管理器，负责将信息存入图数据库
-from typing import Union
+from typing import Optional, Union
 from neo4j import GraphDatabase, Transaction
 from config import NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD  # 导入配置
 from information_extraction import EntityRelationExtractor, KnowledgeGraph  
+from user_profile import UserProfile, UserProfileStore
 # from information_extraction import EntityNode, RelationEdge
 import logging
 import os
@@ -15,15 +16,25 @@ import asyncio
 # os.environ["NEO4J_PASSWORD"] = "12345678"
 
 class EnhancedNeo4jConnector:
-    def __init__(self):
-        self.driver = GraphDatabase.driver(
+    def __init__(self, driver=None, extractor: Optional[EntityRelationExtractor] = None,
+                 profile_store: Optional[UserProfileStore] = None):
+        # 允许传入共享的数据库驱动和信息抽取模块，避免重复创建连接池和LLM客户端
+        self.driver = driver or GraphDatabase.driver(
             NEO4J_URI,
             auth=(NEO4J_USERNAME, NEO4J_PASSWORD)
         )
-        self.extractor = EntityRelationExtractor()  # 直接实例化信息抽取模块
+        self._extractor = extractor
+        self.profile_store = profile_store or UserProfileStore(self.driver)
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.INFO)
     
+    @property
+    def extractor(self) -> EntityRelationExtractor:
+        """信息抽取模块，仅在首次使用时创建"""
+        if self._extractor is None:
+            self._extractor = EntityRelationExtractor()
+        return self._extractor
+
     async def process_text(self, text: str, userid: str) -> Union[KnowledgeGraph, None]:
         """端到端处理流程：文本分析+数据存储"""
         try:
@@ -41,7 +52,7 @@ class EnhancedNeo4jConnector:
             return None
 
 
-    def _execute_transaction(self, tx: Transaction, entities: list, relations: list) -> None:
+    def _execute_transaction(self, tx: Transaction, entities: list, relations: list) -> Optional[UserProfile]:
         """使用APOC实现智能关系合并"""
         try:
             # 批量合并节点（自动去重）
@@ -79,6 +90,9 @@ class EnhancedNeo4jConnector:
             } for r in relations]
             
             tx.run(merge_rels_query, rels=rel_params)
+
+            # 同一事务内增量更新用户画像
+            return self.profile_store.update_in_tx(tx, entities, relations)
         except Exception as e:
             self.logger.error(f"事务执行失败: {str(e)}")
             raise  # 触发自动回滚
@@ -88,16 +102,20 @@ class EnhancedNeo4jConnector:
         with self.driver.session() as session:
             try:
                 # 使用APOC的事务管理
-                result = session.execute_write(
+                profile = session.execute_write(
                     lambda tx: self._execute_transaction(tx, entities, relations)
                 )
+                if profile is not None:
+                    self.profile_store.cache(profile)  # 提交成功后再更新缓存
                 return True
             except Exception as e:
                 self.logger.error(f"数据存储失败: {str(e)}")
                 # 自动触发事务回滚
                 return False
-            finally:
-                self.driver.close()
+
+    def close(self) -> None:
+        """关闭数据库驱动（驱动在多次存储之间复用连接池，不再每次存储后关闭）"""
+        self.driver.close()
 
     def validate_connection(self) -> bool:
         """验证数据库连接"""
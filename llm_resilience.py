@@ -0,0 +1,165 @@
+# llm_resilience.py
+# 大模型调用容错层：按阶段设置截止时间、带抖动的有限重试、可选的对冲请求（应对长尾延迟）以及熔断器。
+# 调用失败时统一抛出StageUnavailable，由各模块自行降级（跳过抽取/词典实体识别/直接用缓存记忆回答）
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+from config import (
+    LLM_STAGE_POLICIES, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY,
+    LLM_BREAKER_FAILURE_THRESHOLD, LLM_BREAKER_RESET_TIMEOUT,
+)
+
+T = TypeVar("T")
+
+
+class StageUnavailable(Exception):
+    """阶段调用超时、重试耗尽或已熔断"""
+    def __init__(self, stage: str, reason: str):
+        super().__init__(f"{stage}阶段不可用: {reason}")
+        self.stage = stage
+        self.reason = reason
+
+
+class CircuitOpen(StageUnavailable):
+    """熔断中，请求未真正发出"""
+    def __init__(self, stage: str):
+        super().__init__(stage, "熔断中")
+
+
+class StagePolicy:
+    def __init__(self, deadline: float, retries: int = 0, hedge_after: Optional[float] = None):
+        self.deadline = deadline  # 整体截止秒数，包括所有重试
+        self.retries = retries  # 首次失败后最多再试几次
+        self.hedge_after = hedge_after  # 超过该秒数仍未返回则并发发出第二个请求
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后熔断，冷却期过后放行一次试探请求"""
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = LLM_BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def release(self) -> None:
+        """试探请求被取消（既未成功也未失败）时释放试探名额，允许下一次试探"""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+class ResilientCaller:
+    def __init__(self, policies: Optional[Dict[str, dict]] = None):
+        self.policies = {
+            stage: StagePolicy(**params)
+            for stage, params in (policies or LLM_STAGE_POLICIES).items()
+        }
+        self.breakers: Dict[str, CircuitBreaker] = {
+            stage: CircuitBreaker() for stage in self.policies
+        }
+        self.logger = logging.getLogger(__name__)
+
+    async def call(self, stage: str, make_call: Callable[[], Awaitable[T]],
+                   non_retryable: Optional[Callable[[BaseException], bool]] = None) -> T:
+        """
+        执行一次带容错的调用。make_call每次调用都要返回新的协程（重试和对冲会多次调用它）。
+        成功返回结果，否则抛出StageUnavailable。
+        non_retryable判定为确定性错误（如模型输出格式不对）的异常不重试、不计入熔断，原样抛出由调用方处理。
+        """
+        policy = self.policies[stage]
+        breaker = self.breakers[stage]
+        if not breaker.allow():
+            raise CircuitOpen(stage)
+
+        try:
+            result = await asyncio.wait_for(
+                self._call_with_retries(stage, policy, make_call, non_retryable),
+                timeout=policy.deadline
+            )
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except asyncio.TimeoutError:
+            breaker.record_failure()
+            self.logger.warning(f"{stage}阶段超过截止时间{policy.deadline}s")
+            raise StageUnavailable(stage, "超时")
+        except Exception as e:
+            if non_retryable is not None and non_retryable(e):
+                breaker.record_success()  # 上游正常返回了结果，只是内容不可用
+                raise
+            breaker.record_failure()
+            self.logger.warning(f"{stage}阶段调用失败: {str(e)}")
+            raise StageUnavailable(stage, str(e))
+
+        breaker.record_success()
+        return result
+
+    async def _call_with_retries(self, stage: str, policy: StagePolicy,
+                                 make_call: Callable[[], Awaitable[T]],
+                                 non_retryable: Optional[Callable[[BaseException], bool]] = None) -> T:
+        for attempt in range(policy.retries + 1):
+            try:
+                return await self._hedged(policy.hedge_after, make_call)
+            except Exception as e:
+                if attempt >= policy.retries or (non_retryable is not None and non_retryable(e)):
+                    raise
+                # 指数退避+全抖动，避免多个请求同时重试
+                delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+                self.logger.info(f"{stage}阶段第{attempt + 1}次失败({str(e)})，{delay:.2f}s后重试")
+                await asyncio.sleep(delay)
+
+    async def _hedged(self, hedge_after: Optional[float],
+                      make_call: Callable[[], Awaitable[T]]) -> T:
+        """对冲请求：首个请求超过hedge_after仍未返回时再发一个，取先成功的结果"""
+        if hedge_after is None:
+            return await make_call()
+
+        tasks = [asyncio.ensure_future(make_call())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                tasks.append(asyncio.ensure_future(make_call()))
+
+            error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
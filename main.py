@@ -1,27 +1,39 @@
 # main.py
 #未来的程序入口，无论是问句还是陈述句都从这里输入，然后调用各个模块的接口进行处理
+#各模块（langchain、neo4j、语音引擎等）均通过组件注册中心懒加载，启动时只导入必要的标准库
 import asyncio
-import pyttsx3  # 导入语音合成库
-from information_extraction import EntityRelationExtractor
-from knowledge_graph_manager import EnhancedNeo4jConnector
-from memory_retrieval import MemoryRetriever
+from concurrent.futures import ThreadPoolExecutor
+from component_registry import ComponentRegistry
 
-# 初始化语音引擎
-engine = pyttsx3.init()
+registry = ComponentRegistry()
+# 语音引擎在首次播报时才初始化
+registry.register("tts_engine", lambda r: r.import_module("pyttsx3").init())
+
+# 语音引擎只在同一个线程里初始化和使用，避免跨线程调用出错
+_tts_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts")
 
 # 定义语音输出函数
 def speak(text):
     """将文本转换为语音并播放"""
+    engine = registry.get("tts_engine")
     engine.say(text)
     engine.runAndWait()
 
+async def speak_async(text):
+    """在语音线程中播放，不阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_tts_executor, speak, text)
+
+async def drain_pending(extractor, connector, retriever):
+    """后台补做之前因大模型不可用而跳过的信息抽取（每次数量有上限）"""
+    for pending_userid, pending_kg in await extractor.retry_pending():
+        connector.store_graph_data(pending_kg.entities, pending_kg.relations)
+        retriever.observe(pending_kg, pending_userid)
+
 async def main_flow():
     userid = "user123"
-    
-    # 初始化各模块
-    extractor = EntityRelationExtractor()
-    connector = EnhancedNeo4jConnector()
-    retriever = MemoryRetriever()
+    loop = asyncio.get_running_loop()
+    drain_task = None
 
     # # 测试数据录入
     # statements = [
@@ -47,22 +59,44 @@ async def main_flow():
     #     response = await retriever.process_question(q, userid)
     #     print(f"助手回答：{response}")
     print("欢迎回来~~我叫Yukino，请问想和我聊什么呀~😊\n如果想退出，请输入'退出'或'exit'~~")
-    speak("欢迎回来，我叫 Yukino，请问想和我聊什么呀？如果想退出，请输入退出或 exit。")
+    # 播放欢迎语的同时预热各模块（创建组件、建立数据库和大模型连接、加载用户画像）
+    await asyncio.gather(
+        speak_async("欢迎回来，我叫 Yukino，请问想和我聊什么呀？如果想退出，请输入退出或 exit。"),
+        registry.warm_up(userid=userid)
+    )
+    print(registry.startup_report())
+
+    # 初始化各模块（已在预热中创建，这里直接取共享实例）
+    extractor = registry.get("extractor")
+    connector = registry.get("connector")
+    retriever = registry.get("retriever")
+
     while True:
-        user_input = input("\n想聊点什么呢~：")
+        # 在线程中等待输入，等待期间后台补做任务可以继续执行
+        user_input = await loop.run_in_executor(None, input, "\n想聊点什么呢~：")
         if user_input == "退出" or user_input == "exit":
             print("再见啦~期待和你的下次聊天呀~😊")
-            speak("再见啦，期待和你的下次聊天呀！")
+            await speak_async("再见啦，期待和你的下次聊天呀！")
             break
         # 处理用户输入
         kg = await extractor.extract(user_input, userid)
         connector.store_graph_data(kg.entities, kg.relations)
+        retriever.observe(kg, userid)
         # print(f"已存储：{user_input}")
         
         # 查询知识图谱
         response = await retriever.process_question(user_input, userid)
         print(f"[助理回答]：{response}")
-        speak(response)  # 将回答转换为语音输出
+        await speak_async(response)  # 将回答转换为语音输出
+
+        # 补做之前因大模型不可用而跳过的信息抽取，放到后台执行，不占用下一轮的响应时间
+        if extractor.pending and (drain_task is None or drain_task.done()):
+            drain_task = asyncio.create_task(drain_pending(extractor, connector, retriever))
+
+    if drain_task is not None and not drain_task.done():
+        drain_task.cancel()
+        await asyncio.gather(drain_task, return_exceptions=True)
+    await registry.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main_flow())
\ No newline at end of file
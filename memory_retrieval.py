@@ -3,23 +3,68 @@
 #（实际流程是只用了实体，然后查找出该实体3跳以内的所有关系一并发送给大模型）
 from neo4j import GraphDatabase
 from config import NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD  # 导入配置
+from collections import OrderedDict
 from typing import Optional, List
 from question_processing import QuestionAnalyzer
 from response_generation import ResponseGenerator
+from working_memory import WorkingMemory
+from user_profile import UserProfileStore, asks_about_self, classify_question
 import asyncio
 import textwrap
 import logging
 
+MEMORY_CACHE_SIZE = 64  # 缓存的记忆片段条数，图谱查询失败时用于兜底
+
 
 class MemoryRetriever:
-    def __init__(self):
-        self.driver = GraphDatabase.driver(
+    def __init__(self, driver=None,
+                 question_analyzer: Optional[QuestionAnalyzer] = None,
+                 response_generator: Optional[ResponseGenerator] = None,
+                 profile_store: Optional[UserProfileStore] = None):
+        # 支持注入共享的数据库驱动与LLM模块（见component_registry）
+        self.driver = driver or GraphDatabase.driver(
             NEO4J_URI,
             auth=(NEO4J_USERNAME, NEO4J_PASSWORD)
         )
-        self.question_analyzer = QuestionAnalyzer()
-        self.response_generator = ResponseGenerator()
+        self.question_analyzer = question_analyzer or QuestionAnalyzer()
+        self.response_generator = response_generator or ResponseGenerator()
+        self.profile_store = profile_store or UserProfileStore(self.driver)
         self.logger = logging.getLogger(__name__)
+        self._memory_cache = OrderedDict()  # (userid, 实体元组) -> 记忆片段
+        self.working_memory = WorkingMemory()  # 按会话的短期工作记忆
+
+    def observe(self, kg, userid: str, session_id: Optional[str] = None) -> None:
+        """记录本轮抽取结果：实体用于降级时的词典匹配，关系放入工作记忆（写库前即可被检索到）"""
+        self.question_analyzer.remember_entities(e.name for e in kg.entities)
+        self.working_memory.session(session_id or userid).add_session_facts(kg.relations)
+
+    def _profile_lookup(self, question: str, userid: str, spotted: List[str]):
+        """
+        常见问题（家人/职业/居住地/兴趣）直接用用户画像回答。
+        没有匹配到亲属时，只有确认在问用户本人（有“我”且不是“我同事”“我朋友”等）才使用本人画像。
+        返回(画像, 涉及的成员)，不能用画像回答时返回None。
+        """
+        question_class = classify_question(question)
+        if question_class is None:
+            return None
+        members = [e for e in spotted if e != userid]
+        if not members and not asks_about_self(question):
+            return None
+        profile = self.profile_store.get(userid)
+        if profile is None or not profile.complete:
+            return None
+        if question_class == "family":
+            return (profile, None) if profile.has_answer("family", userid) else None
+        targets = members or [userid]
+        if all(profile.has_answer(question_class, m) for m in targets):
+            return profile, targets
+        return None
+
+    def _cache_memory(self, key, memory_context: str) -> None:
+        self._memory_cache[key] = memory_context
+        self._memory_cache.move_to_end(key)
+        while len(self._memory_cache) > MEMORY_CACHE_SIZE:
+            self._memory_cache.popitem(last=False)
 
     """
     去除前导空白：将多行字符串中每一行的共同前导空白（如空格、制表符）去除，使文本更紧凑。
@@ -126,24 +171,63 @@ class MemoryRetriever:
             f"-[{fact['rel']}]-> "\
             f"{fact['to']} ({fact.get('to_type','')}){time_str}"
 
-    async def process_question(self, question: str, userid: str) -> str:
-        # 步骤1：分析问题
-        analysis = await self.question_analyzer.analyze(question, userid)
-        # print(f"\n[DEBUG] 问题分析结果：{analysis}")
-        # print(f"[DEBUG] 执行查询：{analysis.target_entities}")
+    async def process_question(self, question: str, userid: str,
+                               session_id: Optional[str] = None) -> str:
+        session = self.working_memory.session(session_id or userid)
 
-        # 步骤2：查询图数据库
-        memory_context = await self._query_graph(
-            analysis.target_entities,
-            analysis.possible_relations
-        )
+        # 步骤0：追问/指代先查工作记忆，命中则跳过问题分析和图谱查询
+        spotted = self.question_analyzer.spot_entities(question)
+        entities = self.working_memory.resolve_entities(session, question, spotted, userid)
+        # 追问本身缺少上下文，生成回答时带上上一轮的问题
+        if entities is not None and session.last_question:
+            answer_question = f"{question}（这是追问，上一个问题是：{session.last_question}）"
+        else:
+            answer_question = question
+        facts = session.lookup(entities) if entities else None
+        profile_hit = self._profile_lookup(question, userid, spotted) if entities is None else None
+        if facts is not None:
+            memory_context = "\n".join(facts)
+        elif profile_hit is not None:
+            # 常见问题直接用用户画像作为上下文，同样跳过问题分析和图谱查询
+            memory_context = ""
+            entities = [userid] + [e for e in spotted if e != userid]
+        else:
+            if entities is None:
+                # 步骤1：分析问题
+                analysis = await self.question_analyzer.analyze(question, userid)
+                entities = analysis.target_entities
+                relations = analysis.possible_relations
+                # print(f"\n[DEBUG] 问题分析结果：{analysis}")
+                # print(f"[DEBUG] 执行查询：{analysis.target_entities}")
+            else:
+                # 追问未命中工作记忆：已解析出实体，直接查图谱（问题分析无法理解脱离上下文的“她”）
+                relations = []
+
+            # 步骤2：查询图数据库，查询失败时使用缓存的记忆片段
+            memory_context = await self._query_graph(entities, relations)
+            cache_key = (userid, tuple(sorted(entities)))
+            if memory_context:
+                self._cache_memory(cache_key, memory_context)
+                session.record_retrieval(entities, memory_context.splitlines())
+            else:
+                memory_context = self._memory_cache.get(cache_key)
+        session.add_turn(question, entities)
+
+        # 本次对话中新抽取、可能尚未写入图数据库的关系
+        recent_facts = session.session_facts_for(entities)
+        if recent_facts:
+            memory_context = "\n".join(filter(None, [memory_context] + recent_facts))
         
+        if profile_hit is not None:
+            profile, members = profile_hit
+            return await self.response_generator.generate(answer_question, memory_context, profile, members)
+
         if not memory_context:
             memory_context = "暂时没有相关记忆"
         # print(f"[DEBUG] 原始记忆片段：\n{memory_context}")
 
         # 步骤3：生成回答
-        return await self.response_generator.generate(question, memory_context)
+        return await self.response_generator.generate(answer_question, memory_context)
 async def main_flow():
     
     test_analyzer = QuestionAnalyzer()
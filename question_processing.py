@@ -1,13 +1,15 @@
 # question_processing.py
 # 问题分析模块，用于分析用户提问中的核心实体和关系类型
-from typing import List
+from typing import Iterable, List, Optional
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.exceptions import OutputParserException
 from langchain_core.runnables import RunnablePassthrough
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 from pydantic import ValidationError
-from config import OPENAI_API_KEY, OPENAI_API_BASE  # 导入配置
+from config import OPENAI_API_KEY, OPENAI_API_BASE, LLM_MODEL_NAME  # 导入配置
+from llm_resilience import ResilientCaller, StageUnavailable
 
 import os
 
@@ -18,9 +20,28 @@ class QuestionEntities(BaseModel):
     target_entities: List[str] = Field(..., description="问题中涉及的核心实体列表")
     possible_relations: List[str] = Field(..., description="问题中可能涉及的关系类型")
 
+# 词典实体识别用的亲属称谓：图谱中的实体名 -> 问句中可能出现的说法（长的放前面）
+KINSHIP_ALIASES = {
+    "爸爸": ["爸爸", "父亲", "老爸", "爸"],
+    "妈妈": ["妈妈", "母亲", "老妈", "妈"],
+    "女朋友": ["女朋友", "女友"],
+    "男朋友": ["男朋友", "男友"],
+    "哥哥": ["哥哥", "哥"],
+    "姐姐": ["姐姐", "姐"],
+    "弟弟": ["弟弟"],
+    "妹妹": ["妹妹"],
+    "爷爷": ["爷爷"],
+    "奶奶": ["奶奶"],
+    "老婆": ["老婆", "妻子"],
+    "老公": ["老公", "丈夫"],
+}
+MAX_KNOWN_ENTITIES = 2000  # 已知实体名上限
+
 class QuestionAnalyzer:
-    def __init__(self):
+    def __init__(self, llm=None, caller: Optional[ResilientCaller] = None):
         self.parser = JsonOutputParser(pydantic_object=QuestionEntities)
+        self.caller = caller or ResilientCaller()
+        self.known_entities = set()  # 本次运行中见过的实体名，用于降级时的词典匹配
         
         system_prompt = """您需要精确识别问题中的关键要素：
 1. 核心实体提取规则：
@@ -43,13 +64,18 @@ class QuestionAnalyzer:
             ("human", "待分析问题：{question}")
         ])
         
-        self.model = ChatOpenAI(
-            model_name="deepseek-chat",
-            temperature=0.2,
-            max_tokens=512,
-            openai_api_key=os.getenv("OPENAI_API_KEY"),
-            openai_api_base=os.getenv("OPENAI_API_BASE")
-        )
+        if llm is not None:
+            # 复用共享客户端（连接池），只绑定本模块的采样参数
+            self.model = llm.bind(temperature=0.2, max_tokens=512)
+        else:
+            self.model = ChatOpenAI(
+                model_name=LLM_MODEL_NAME,
+                temperature=0.2,
+                max_tokens=512,
+                openai_api_key=os.getenv("OPENAI_API_KEY"),
+                openai_api_base=os.getenv("OPENAI_API_BASE"),
+                max_retries=0  # 重试统一由ResilientCaller负责
+            )
         
         self.chain = (
             {"question": RunnablePassthrough()}
@@ -60,17 +86,57 @@ class QuestionAnalyzer:
 
     async def analyze(self, question: str, userid: str) -> QuestionEntities:
         processed_question = "用户userid:"+userid+"用户提问："+question
-        raw_result = await self.chain.ainvoke(processed_question)
+        try:
+            raw_result = await self.caller.call(
+                "analysis", lambda: self.chain.ainvoke(processed_question),
+                non_retryable=lambda e: isinstance(e, OutputParserException)
+            )
+        except StageUnavailable as e:
+            # 降级：不调用大模型，用userid加词典匹配到的实体去查图谱
+            print(f"问题分析暂不可用，改用词典匹配: {str(e)}")
+            return self._lexical_analysis(question, userid)
+        except OutputParserException as e:
+            print(f"解析错误: {str(e)}")
+            return self._lexical_analysis(question, userid)
         # 将原始字典转换为Pydantic模型
+        if not isinstance(raw_result, dict):
+            print(f"解析错误: 期望JSON对象，实际为{type(raw_result).__name__}")
+            return self._lexical_analysis(question, userid)
         try:
             result = QuestionEntities(**raw_result)
         except ValidationError as e:
             # 处理解析失败的情况
             print(f"解析错误: {str(e)}")
-            result = QuestionEntities(target_entities=[userid], possible_relations=[])
+            return self._lexical_analysis(question, userid)
 
         # 确保userid始终存在
         if userid not in result.target_entities:
             result.target_entities.insert(0, userid)
         
-        return result
\ No newline at end of file
+        return result
+
+    def _lexical_analysis(self, question: str, userid: str) -> QuestionEntities:
+        """不依赖大模型的分析结果：userid加词典匹配到的实体"""
+        return QuestionEntities(
+            target_entities=[userid] + self.spot_entities(question),
+            possible_relations=[]
+        )
+
+    def remember_entities(self, names: Iterable[str]) -> None:
+        """记录已知实体名，供降级时的词典匹配使用"""
+        for name in names:
+            if len(self.known_entities) >= MAX_KNOWN_ENTITIES:
+                break
+            if name and len(name) >= 2:
+                self.known_entities.add(name)
+
+    def spot_entities(self, question: str) -> List[str]:
+        """词典实体识别：匹配亲属称谓和已知实体名"""
+        found = []
+        for name, aliases in KINSHIP_ALIASES.items():
+            if any(alias in question for alias in aliases):
+                found.append(name)
+        for name in self.known_entities:
+            if name in question and name not in found:
+                found.append(name)
+        return found
@@ -3,7 +3,10 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 from config import NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD  # 导入配置
-from config import OPENAI_API_KEY, OPENAI_API_BASE  # 导入配置
+from config import OPENAI_API_KEY, OPENAI_API_BASE, LLM_MODEL_NAME  # 导入配置
+from llm_resilience import ResilientCaller, StageUnavailable
+from typing import Optional
+from user_profile import UserProfile
 import os
 os.environ["NEO4J_URI"] = NEO4J_URI
 os.environ["NEO4J_USERNAME"] = NEO4J_USERNAME
@@ -13,8 +16,11 @@ os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 os.environ["OPENAI_API_BASE"] = OPENAI_API_BASE
 
 
+FALLBACK_MAX_FACTS = 5  # 降级回答时最多直接念出的记忆条数
+
 class ResponseGenerator:
-    def __init__(self):
+    def __init__(self, llm=None, caller: Optional[ResilientCaller] = None):
+        self.caller = caller or ResilientCaller()
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """您是基于记忆库的贴心助手，请根据以下规则生成回答：
 1. 使用自然的口语化表达，适当添加语气词
@@ -31,19 +37,41 @@ class ResponseGenerator:
 {question}""")
         ])
         
-        self.model = ChatOpenAI(
-            model_name="deepseek-chat",
-            temperature=0.7,
-            max_tokens=1024,
-            openai_api_key=os.getenv("OPENAI_API_KEY"),
-            openai_api_base=os.getenv("OPENAI_API_BASE")
-        )
+        if llm is not None:
+            # 复用共享客户端（连接池），只绑定本模块的采样参数
+            self.model = llm.bind(temperature=0.7, max_tokens=1024)
+        else:
+            self.model = ChatOpenAI(
+                model_name=LLM_MODEL_NAME,
+                temperature=0.7,
+                max_tokens=1024,
+                openai_api_key=os.getenv("OPENAI_API_KEY"),
+                openai_api_base=os.getenv("OPENAI_API_BASE"),
+                max_retries=0  # 重试统一由ResilientCaller负责
+            )
         
         self.chain = self.prompt | self.model
 
-    async def generate(self, question: str, memory: str) -> str:
-        result = await self.chain.ainvoke({
-            "question": question,
-            "memory_context": memory
-        })
-        return result.content
\ No newline at end of file
+    async def generate(self, question: str, memory: str,
+                       profile: Optional[UserProfile] = None,
+                       members: Optional[list] = None) -> str:
+        """profile不为空时，把用户画像（可只取members中的成员）放在记忆片段前作为上下文"""
+        if profile is not None:
+            profile_context = profile.to_context(members)
+            memory = "\n".join(filter(None, ["[用户画像]", profile_context, memory]))
+        try:
+            result = await self.caller.call("response", lambda: self.chain.ainvoke({
+                "question": question,
+                "memory_context": memory
+            }))
+        except StageUnavailable as e:
+            print(f"回答生成暂不可用，直接使用记忆回答: {str(e)}")
+            return self.fallback_answer(memory)
+        return result.content
+
+    def fallback_answer(self, memory: str) -> str:
+        """降级回答：不经过大模型，直接复述最相关的几条记忆"""
+        facts = [line for line in memory.splitlines() if line.strip()]
+        if not facts or memory == "暂时没有相关记忆":
+            return "抱歉呀，我现在有点反应不过来，也没想起相关的事情，等会儿再问我好吗~"
+        return "我现在有点反应不过来，不过我记得这些哦：\n" + "\n".join(facts[:FALLBACK_MAX_FACTS])
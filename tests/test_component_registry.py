@@ -0,0 +1,41 @@
+# 组件注册中心测试：懒加载、单例与独占计时
+import time
+import component_registry
+from component_registry import ComponentRegistry
+
+
+def test_components_created_lazily_and_once():
+    registry = ComponentRegistry()
+    created = []
+    registry.register("child", lambda r: created.append("child") or "child")
+    registry.register("parent", lambda r: created.append("parent") or (r.get("child"), "parent"))
+
+    assert created == []
+    assert not registry.is_created("parent")
+    first = registry.get("parent")
+    assert registry.get("parent") is first
+    assert registry.get("child") == "child"
+    assert created == ["parent", "child"]
+
+def test_nested_init_time_excluded_from_parent():
+    registry = ComponentRegistry()
+    registry.register("child", lambda r: time.sleep(0.1))
+    registry.register("parent", lambda r: (time.sleep(0.05), r.get("child")))
+
+    registry.get("parent")
+    timings = {name: cost for stage, name, cost in registry._timings if stage == "init"}
+    assert timings["child"] >= 0.1
+    assert 0.05 <= timings["parent"] < 0.1
+
+def test_import_time_excluded_from_init(monkeypatch):
+    def slow_import(name):
+        time.sleep(0.05)
+        return name
+    monkeypatch.setattr(component_registry.importlib, "import_module", slow_import)
+    registry = ComponentRegistry()
+    registry.register("mod", lambda r: r.import_module("fake_module_for_test"))
+
+    registry.get("mod")
+    timings = {(stage, name): cost for stage, name, cost in registry._timings}
+    assert timings[("import", "fake_module_for_test")] >= 0.05
+    assert timings[("init", "mod")] < 0.05
@@ -0,0 +1,146 @@
+# 容错调用层测试：熔断器状态转换、重试、对冲请求与截止时间
+import asyncio
+import pytest
+from llm_resilience import CircuitBreaker, CircuitOpen, ResilientCaller, StageUnavailable
+
+
+def make_caller(**policy):
+    params = {"deadline": 0.5, "retries": 0, "hedge_after": None}
+    params.update(policy)
+    return ResilientCaller({"stage": params})
+
+async def fail():
+    raise RuntimeError("upstream error")
+
+async def hang():
+    await asyncio.sleep(10)
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+def test_breaker_half_open_allows_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # 试探请求进行中
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+def test_breaker_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(3):
+        breaker.record_failure()
+    breaker.opened_at -= 60
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+def test_cancelled_probe_releases_breaker():
+    caller = make_caller()
+    breaker = caller.breakers["stage"]
+    breaker.reset_timeout = 0
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    async def run():
+        task = asyncio.ensure_future(caller.call("stage", hang))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+def test_open_breaker_rejects_without_calling():
+    caller = make_caller()
+    caller.breakers["stage"].failure_threshold = 1
+    calls = []
+
+    async def tracked():
+        calls.append(1)
+        raise RuntimeError("boom")
+
+    with pytest.raises(StageUnavailable):
+        asyncio.run(caller.call("stage", tracked))
+    with pytest.raises(CircuitOpen):
+        asyncio.run(caller.call("stage", tracked))
+    assert len(calls) == 1
+
+def test_retries_until_success():
+    caller = make_caller(retries=2, deadline=5)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("transient")
+        return "ok"
+
+    assert asyncio.run(caller.call("stage", flaky)) == "ok"
+    assert len(attempts) == 3
+    assert caller.breakers["stage"].failures == 0
+
+def test_retries_exhausted_raises_stage_unavailable():
+    caller = make_caller(retries=1)
+    with pytest.raises(StageUnavailable):
+        asyncio.run(caller.call("stage", fail))
+    assert caller.breakers["stage"].failures == 1
+
+def test_deadline_caps_call():
+    caller = make_caller(deadline=0.05)
+    with pytest.raises(StageUnavailable) as exc:
+        asyncio.run(caller.call("stage", hang))
+    assert exc.value.reason == "超时"
+
+def test_hedged_request_returns_first_success():
+    caller = make_caller(hedge_after=0.02)
+    calls = []
+
+    async def slow_first():
+        calls.append(1)
+        await asyncio.sleep(10 if len(calls) == 1 else 0)
+        return len(calls)
+
+    assert asyncio.run(caller.call("stage", slow_first)) == 2
+
+def test_hedged_request_survives_one_failure():
+    caller = make_caller(hedge_after=0.01)
+    calls = []
+
+    async def fail_first():
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(0.02)
+            raise RuntimeError("first failed")
+        await asyncio.sleep(0.05)
+        return "second"
+
+    assert asyncio.run(caller.call("stage", fail_first)) == "second"
+
+def test_non_retryable_error_raised_without_retry_or_breaker():
+    caller = make_caller(retries=2, deadline=5)
+    caller.breakers["stage"].failure_threshold = 1
+    calls = []
+
+    async def bad_output():
+        calls.append(1)
+        raise ValueError("malformed json")
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            asyncio.run(caller.call(
+                "stage", bad_output, non_retryable=lambda e: isinstance(e, ValueError)
+            ))
+    assert len(calls) == 2
+    assert caller.breakers["stage"].state == "closed"
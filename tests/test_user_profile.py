@@ -0,0 +1,193 @@
+# 用户画像测试：关系归类与合并、按需创建画像节点、从图谱回填
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("pydantic")
+import user_profile
+from user_profile import UserProfile, UserProfileStore, asks_about_self, classify_question
+
+
+def entity(name, type_):
+    return SimpleNamespace(name=name, type=type_)
+
+def relation(subject, relationship, obj):
+    return SimpleNamespace(subject=subject, relationship=relationship, object=obj)
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def single(self):
+        return self.rows[0] if self.rows else None
+
+    def data(self):
+        return self.rows
+
+
+class FakeTx:
+    """按查询语句模拟UserProfile节点读写和回填查询"""
+    def __init__(self, node=None, graph_rows=None):
+        self.node = node  # {"doc":..., "version":...}
+        self.graph_rows = graph_rows or []
+
+    def run(self, query, **params):
+        if "CALL {" in query:
+            self.backfills = getattr(self, "backfills", 0) + 1
+            return FakeResult(self.graph_rows)
+        if "MERGE (p:UserProfile" in query:
+            if self.node is None:
+                self.node = {"doc": None, "version": 0}
+            return FakeResult([dict(self.node)])
+        if "SET p.doc" in query:
+            self.node.update(doc=params["doc"], version=params["version"])
+            return FakeResult([])
+        return FakeResult([dict(self.node)] if self.node is not None else [])
+
+
+class FakeSession:
+    def __init__(self, tx):
+        self.tx = tx
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        return self.tx.run(query, **params)
+
+    def execute_write(self, fn):
+        return fn(self.tx)
+
+
+class FakeDriver:
+    def __init__(self, tx):
+        self.tx = tx
+
+    def session(self):
+        return FakeSession(self.tx)
+
+
+ENTITIES = [
+    entity("u", "core_user"), entity("妈妈", "亲属"), entity("数学老师", "职业"),
+    entity("上海", "地点"), entity("跑步", "运动"), entity("手机", "消费物品"),
+]
+
+
+def test_apply_classifies_relations():
+    profile = UserProfile(userid="u")
+    changed = UserProfileStore.apply(profile, ENTITIES, [
+        relation("u", "母亲", "妈妈"),
+        relation("妈妈", "职业", "数学老师"),
+        relation("u", "居住在", "上海"),
+        relation("u", "喜欢", "跑步"),
+        relation("妈妈", "购买过", "手机"),
+    ])
+    assert changed
+    assert profile.members["妈妈"].relation == "母亲"
+    assert profile.members["妈妈"].jobs == ["数学老师"]
+    assert profile.members["u"].locations == ["上海"]
+    assert profile.members["u"].interests == ["跑步"]
+    assert profile.has_answer("jobs", "妈妈")
+    assert not profile.has_answer("jobs", "u")
+    assert profile.has_answer("family", "u")
+
+def test_apply_is_idempotent():
+    profile = UserProfile(userid="u")
+    rels = [relation("u", "母亲", "妈妈"), relation("u", "喜欢", "跑步")]
+    assert UserProfileStore.apply(profile, ENTITIES, rels)
+    assert not UserProfileStore.apply(profile, ENTITIES, rels)
+
+def test_apply_ignores_unrelated_subjects():
+    profile = UserProfile(userid="u")
+    assert not UserProfileStore.apply(profile, ENTITIES, [relation("同事", "喜欢", "跑步")])
+    assert profile.members == {}
+
+def test_family_has_no_answer_without_relatives():
+    profile = UserProfile(userid="u", complete=True)
+    assert not profile.has_answer("family", "u")
+
+def test_irrelevant_store_does_not_create_profile_node():
+    store = UserProfileStore(driver=None)
+    tx = FakeTx()
+    result = store.update_in_tx(
+        tx, [entity("u", "core_user"), entity("手机", "消费物品")], [relation("u", "购买过", "手机")]
+    )
+    assert result is None
+    assert tx.node is None
+
+def test_first_update_backfills_from_graph():
+    store = UserProfileStore(driver=None)
+    tx = FakeTx(graph_rows=[
+        {"subject": "u", "subject_labels": ["core_user"], "relationship": "职业",
+         "object": "工程师", "object_labels": ["职业"]},
+        {"subject": "u", "subject_labels": ["core_user"], "relationship": "父亲",
+         "object": "爸爸", "object_labels": ["亲属"]},
+    ])
+    profile = store.update_in_tx(tx, ENTITIES, [relation("u", "喜欢", "跑步")])
+    assert profile.complete
+    assert profile.version == 1
+    assert profile.members["u"].jobs == ["工程师"]
+    assert profile.members["u"].interests == ["跑步"]
+    assert profile.members["爸爸"].relation == "父亲"
+    assert tx.node["version"] == 1
+
+def test_incomplete_stored_profile_is_backfilled():
+    store = UserProfileStore(driver=None)
+    partial = UserProfile(userid="u", members={"u": {"interests": ["跑步"]}})
+    tx = FakeTx(
+        node={"doc": UserProfileStore._dump(partial), "version": 3},
+        graph_rows=[{"subject": "u", "subject_labels": ["core_user"], "relationship": "居住在",
+                     "object": "上海", "object_labels": ["地点"]}],
+    )
+    profile = store._update_in_tx(tx, "u", {}, [])
+    assert profile.complete
+    assert profile.version == 4
+    assert profile.members["u"].locations == ["上海"]
+    assert profile.members["u"].interests == ["跑步"]
+
+@pytest.mark.parametrize("question, expected", [
+    ("我爸的工作是什么？", "jobs"),
+    ("我有哪些家人？", "family"),
+    ("我妈妈喜欢什么？", "interests"),
+    ("我妈妈最近买了什么？", None),
+])
+def test_classify_question(question, expected):
+    assert classify_question(question) == expected
+
+@pytest.mark.parametrize("question, expected", [
+    ("我喜欢什么？", True),
+    ("我的工作是什么？", True),
+    ("我有哪些家人？", True),
+    ("我同事小王喜欢什么？", False),
+    ("我朋友在哪里工作？", False),
+    ("我的老板住在哪？", False),
+    ("小王喜欢什么？", False),
+])
+def test_asks_about_self(question, expected):
+    assert asks_about_self(question) == expected
+
+def test_absent_profile_cached_without_repeated_backfill():
+    tx = FakeTx()
+    store = UserProfileStore(FakeDriver(tx))
+    assert store.get("u") is None
+    assert store.get("u") is None
+    assert tx.backfills == 1
+
+def test_absent_profile_rechecked_after_ttl_without_backfill(monkeypatch):
+    tx = FakeTx()
+    store = UserProfileStore(FakeDriver(tx))
+    store.get("u")
+    monkeypatch.setattr(user_profile, "PROFILE_CACHE_TTL", 0)
+    assert store.get("u") is None
+    assert tx.backfills == 1
+
+def test_committed_profile_clears_absent_entry():
+    tx = FakeTx()
+    store = UserProfileStore(FakeDriver(tx))
+    store.get("u")
+    profile = store.update_in_tx(tx, ENTITIES, [relation("u", "喜欢", "跑步")])
+    store.cache(profile)
+    assert store.get("u").members["u"].interests == ["跑步"]
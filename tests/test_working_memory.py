@@ -0,0 +1,91 @@
+# 短期工作记忆测试：追问判断、指代解析、检索命中与容量淘汰
+from types import SimpleNamespace
+import pytest
+import working_memory
+from working_memory import WorkingMemory
+
+
+@pytest.fixture
+def memory():
+    wm = WorkingMemory()
+    session = wm.session("u")
+    session.add_turn("我妈妈最近买了什么？", ["u", "妈妈"])
+    session.record_retrieval(["u", "妈妈"], ["妈妈(亲属) -[购买过]-> 手机(消费物品)"])
+    return wm, session
+
+
+@pytest.mark.parametrize("question", ["那她呢？", "那我爸呢？", "她喜欢什么？", "他呢"])
+def test_follow_up_detected(question):
+    assert WorkingMemory.is_follow_up(question)
+
+@pytest.mark.parametrize("question", [
+    "我喜欢弹吉他吗？", "我还有其他爱好吗？", "它山之石是什么意思",
+    "我喜欢什么呢？", "我爸的工作是什么？",
+])
+def test_not_follow_up(question):
+    assert not WorkingMemory.is_follow_up(question)
+
+def test_pronoun_resolves_to_previous_entities(memory):
+    wm, session = memory
+    entities = wm.resolve_entities(session, "那她呢？", [], "u")
+    assert entities == ["u", "妈妈"]
+    assert session.lookup(entities) == ["妈妈(亲属) -[购买过]-> 手机(消费物品)"]
+
+def test_elliptical_follow_up_uses_spotted_entities(memory):
+    wm, session = memory
+    entities = wm.resolve_entities(session, "那我爸呢？", ["爸爸"], "u")
+    assert entities == ["u", "爸爸"]
+    assert session.lookup(entities) is None
+
+@pytest.mark.parametrize("question", ["那小明呢？", "还有小王呢", "你呢？"])
+def test_elliptical_follow_up_with_new_subject_not_resolved(memory, question):
+    wm, session = memory
+    assert wm.resolve_entities(session, question, [], "u") is None
+
+@pytest.mark.parametrize("question", ["那工作呢？", "还有爱好呢"])
+def test_elliptical_follow_up_on_same_subject_reuses_previous(memory, question):
+    wm, session = memory
+    assert wm.resolve_entities(session, question, [], "u") == ["u", "妈妈"]
+
+def test_non_follow_up_is_not_resolved(memory):
+    wm, session = memory
+    assert wm.resolve_entities(session, "我还有其他爱好吗？", [], "u") is None
+
+def test_follow_up_without_history_is_not_resolved():
+    wm = WorkingMemory()
+    assert wm.resolve_entities(wm.session("u"), "那她呢？", [], "u") is None
+
+def test_lookup_matches_subset_of_retrieval(memory):
+    _, session = memory
+    assert session.lookup(["妈妈"]) is not None
+    assert session.lookup(["u", "妈妈", "爸爸"]) is None
+
+def test_last_question(memory):
+    _, session = memory
+    assert session.last_question == "我妈妈最近买了什么？"
+
+def test_session_facts_filtered_by_entity(memory):
+    _, session = memory
+    session.add_session_facts([
+        SimpleNamespace(subject="妈妈", relationship="喜欢", object="跑步"),
+        SimpleNamespace(subject="爸爸", relationship="职业", object="老师"),
+    ])
+    assert session.session_facts_for(["妈妈"]) == ["妈妈 -[喜欢]-> 跑步 (本次对话)"]
+
+def test_retrievals_evicted_lru(monkeypatch):
+    monkeypatch.setattr(working_memory, "MAX_RETRIEVALS", 2)
+    session = WorkingMemory().session("u")
+    session.record_retrieval(["a"], ["fa"])
+    session.record_retrieval(["b"], ["fb"])
+    session.lookup(["a"])  # 访问后a变为最近使用
+    session.record_retrieval(["c"], ["fc"])
+    assert session.lookup(["b"]) is None
+    assert session.lookup(["a"]) == ["fa"]
+
+def test_sessions_evicted_lru(monkeypatch):
+    monkeypatch.setattr(working_memory, "MAX_SESSIONS", 2)
+    wm = WorkingMemory()
+    first = wm.session("s1")
+    wm.session("s2")
+    wm.session("s3")
+    assert wm.session("s1") is not first
@@ -0,0 +1,294 @@
+# user_profile.py
+# 用户画像：为每个userid维护一份精简的画像文档（家人、职业、居住地、兴趣），
+# 在知识图谱写入事务中增量更新，和图数据一起存在neo4j的UserProfile节点上，并带版本号缓存在内存中。
+# 常见问题（如“我爸的工作是什么？”）可直接用画像作为上下文回答，跳过问题分析和图谱遍历
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+
+MAX_ITEMS_PER_FIELD = 10  # 每个字段最多保留的条目数，超出时丢弃最早的
+PROFILE_CACHE_TTL = 30.0  # 缓存超过该秒数后，先比对数据库中的版本号再决定是否重新加载
+
+PROFILE_FIELDS = ("jobs", "locations", "interests")
+FIELD_NAMES = {"jobs": "职业", "locations": "居住地", "interests": "兴趣"}
+
+# 关系归类规则：关系名关键词 / 宾语实体类型
+JOB_KEYWORDS = ("工作", "职业", "担任", "就职", "任职")
+LOCATION_KEYWORDS = ("居住", "住在", "生活在", "家在")
+INTEREST_KEYWORDS = ("喜欢", "爱好", "兴趣", "关注", "擅长")
+JOB_TYPES = ("职业",)
+INTEREST_TYPES = ("兴趣", "体育运动", "运动")
+KIN_TYPE = "亲属"
+
+# 可直接用画像回答的问题类型
+QUESTION_KEYWORDS = {
+    "family": ("家人", "家里人", "亲人", "家庭"),
+    "jobs": ("工作", "职业", "上班", "做什么的"),
+    "locations": ("住在", "住哪", "在哪住", "哪里人", "家在"),
+    "interests": ("喜欢", "爱好", "兴趣"),
+}
+
+# 问句中“我/我的”后面跟这些词时，问的是其他人而不是用户本人（亲属称谓由词典匹配单独处理）
+OTHER_PERSON_WORDS = (
+    "同事", "朋友", "老板", "领导", "上司", "同学", "室友", "舍友", "邻居", "老师",
+    "客户", "对象", "孩子", "儿子", "女儿", "闺蜜", "兄弟", "伙伴", "搭档", "网友",
+    "学生", "徒弟", "师父", "师傅", "偶像", "宠物", "猫", "狗",
+)
+
+
+class ProfileEntry(BaseModel):
+    relation: str = ""  # 与用户的关系，本人为空
+    jobs: List[str] = []
+    locations: List[str] = []
+    interests: List[str] = []
+
+
+class UserProfile(BaseModel):
+    userid: str
+    version: int = 0
+    complete: bool = False  # 是否已包含图谱中的历史关系（回填完成前不能作为权威答案）
+    members: Dict[str, ProfileEntry] = {}  # 实体名 -> 画像条目，本人以userid为键
+
+    def has_answer(self, question_class: str, member: str) -> bool:
+        if question_class == "family":
+            return any(name != self.userid for name in self.members)
+        entry = self.members.get(member)
+        return bool(entry and getattr(entry, question_class))
+
+    def to_context(self, members: Optional[List[str]] = None) -> str:
+        """生成精简的画像文本，members为空时输出全部成员"""
+        lines = []
+        for name, entry in self.members.items():
+            if members is not None and name not in members:
+                continue
+            title = f"{name}(本人)" if name == self.userid else f"{name}({entry.relation or '亲属'})"
+            parts = [
+                f"{FIELD_NAMES[field]}：{'、'.join(reversed(getattr(entry, field)))}"
+                for field in PROFILE_FIELDS if getattr(entry, field)
+            ]
+            lines.append(f"{title}：{'；'.join(parts) if parts else '暂无更多信息'}")
+        return "\n".join(lines)
+
+
+def classify_relation(relationship: str, object_type: str) -> Optional[str]:
+    """把一条关系归入画像字段，不相关返回None"""
+    if object_type == KIN_TYPE:
+        return "family"
+    if any(k in relationship for k in JOB_KEYWORDS) or object_type in JOB_TYPES:
+        return "jobs"
+    if any(k in relationship for k in LOCATION_KEYWORDS):
+        return "locations"
+    if any(k in relationship for k in INTEREST_KEYWORDS) or object_type in INTEREST_TYPES:
+        return "interests"
+    return None
+
+def asks_about_self(question: str) -> bool:
+    """问句是否在问用户本人：要有“我”，且“我/我的”后面不是同事、朋友等其他人"""
+    found = False
+    for i, ch in enumerate(question):
+        if ch != "我":
+            continue
+        found = True
+        rest = question[i + 1:]
+        if rest.startswith("的"):
+            rest = rest[1:]
+        if rest.startswith(OTHER_PERSON_WORDS):
+            return False
+    return found
+
+def classify_question(question: str) -> Optional[str]:
+    for question_class, keywords in QUESTION_KEYWORDS.items():
+        if any(k in question for k in keywords):
+            return question_class
+    return None
+
+def _append_unique(items: List[str], value: str) -> bool:
+    if value in items:
+        if items[-1] == value:
+            return False
+        items.remove(value)  # 再次提及时移到最新
+    items.append(value)
+    del items[:-MAX_ITEMS_PER_FIELD]
+    return True
+
+
+class UserProfileStore:
+    def __init__(self, driver):
+        self.driver = driver
+        self.logger = logging.getLogger(__name__)
+        self._cache: Dict[str, UserProfile] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._absent: Dict[str, float] = {}  # 确认没有画像的用户 -> 确认时间
+
+    @staticmethod
+    def apply(profile: UserProfile, entities: list, relations: list) -> bool:
+        """把一批实体关系合并进画像，返回画像是否有变化"""
+        types = {e.name: e.type for e in entities}
+        triples = [(r.subject, r.relationship, r.object) for r in relations]
+        return UserProfileStore._merge(profile, types, triples)
+
+    @staticmethod
+    def _merge(profile: UserProfile, types: Dict[str, str], triples: list) -> bool:
+        userid = profile.userid
+        changed = False
+        for subject, relationship, obj in triples:
+            kind = classify_relation(relationship, types.get(obj, ""))
+            if kind is None:
+                continue
+            if subject == userid:
+                if kind == "family":
+                    entry = profile.members.setdefault(obj, ProfileEntry())
+                    if entry.relation != relationship:
+                        entry.relation = relationship
+                        changed = True
+                    continue
+                entry = profile.members.setdefault(userid, ProfileEntry())
+            elif subject in profile.members or types.get(subject) == KIN_TYPE:
+                if kind == "family":
+                    continue  # 只记录与用户直接相关的亲属
+                entry = profile.members.setdefault(subject, ProfileEntry())
+            else:
+                continue
+            changed = _append_unique(getattr(entry, kind), obj) or changed
+        return changed
+
+    def update_in_tx(self, tx, entities: list, relations: list) -> Optional[UserProfile]:
+        """在知识图谱写入事务中增量更新画像，无相关关系时返回None"""
+        userid = next((e.name for e in entities if e.type == "core_user"), None)
+        if userid is None or not relations:
+            return None
+        types = {e.name: e.type for e in entities}
+        triples = [(r.subject, r.relationship, r.object) for r in relations]
+        return self._update_in_tx(tx, userid, types, triples)
+
+    def _update_in_tx(self, tx, userid: str, types: Dict[str, str], triples: list) -> Optional[UserProfile]:
+        """
+        合并关系并写回画像。画像不完整（尚未从图谱回填）时先回填。
+        只有画像确实有变化时才创建/更新UserProfile节点，避免留下空画像。
+        """
+        record = tx.run(
+            "MATCH (p:UserProfile {userid: $userid}) RETURN p.doc AS doc, p.version AS version",
+            userid=userid
+        ).single()
+        profile = self._from_record(userid, record)
+        if not self._refresh(tx, profile, types, triples):
+            return None
+
+        # 加写锁后确认期间没有其他事务更新过画像，否则基于最新版本重新合并
+        record = tx.run("""
+        MERGE (p:UserProfile {userid: $userid})
+        SET p.version = coalesce(p.version, 0)
+        RETURN p.doc AS doc, p.version AS version
+        """, userid=userid).single()
+        if (record["version"] or 0) != profile.version:
+            profile = self._from_record(userid, record)
+            self._refresh(tx, profile, types, triples)
+
+        profile.version += 1
+        tx.run("""
+        MATCH (p:UserProfile {userid: $userid})
+        SET p.doc = $doc, p.version = $version, p.update_time = datetime()
+        """, userid=userid, doc=self._dump(profile), version=profile.version)
+        return profile
+
+    def _refresh(self, tx, profile: UserProfile, types: Dict[str, str], triples: list) -> bool:
+        changed = False
+        if not profile.complete:
+            self._backfill(tx, profile)
+            profile.complete = True
+            changed = bool(profile.members)
+        return self._merge(profile, types, triples) or changed
+
+    def _backfill(self, tx, profile: UserProfile) -> None:
+        """从图谱中已有的关系生成画像（用户本人及其亲属的一跳关系），实体类型取节点标签"""
+        records = tx.run("""
+        CALL {
+            MATCH (u {name: $userid})-[r]->(o)
+            RETURN u.name AS subject, labels(u) AS subject_labels,
+                   type(r) AS relationship, o.name AS object, labels(o) AS object_labels,
+                   r.create_time AS time
+            UNION
+            MATCH (u {name: $userid})-->(k:亲属)-[r]->(o)
+            RETURN k.name AS subject, labels(k) AS subject_labels,
+                   type(r) AS relationship, o.name AS object, labels(o) AS object_labels,
+                   r.create_time AS time
+        }
+        RETURN subject, subject_labels, relationship, object, object_labels
+        ORDER BY time
+        """, userid=profile.userid).data()
+        types: Dict[str, str] = {}
+        triples = []
+        for record in records:
+            for name, labels in ((record["subject"], record["subject_labels"]),
+                                 (record["object"], record["object_labels"])):
+                if labels:
+                    types[name] = labels[0]
+            triples.append((record["subject"], record["relationship"], record["object"]))
+        # 按时间顺序合并，较新的关系排在后面
+        self._merge(profile, types, triples)
+
+    def cache(self, profile: UserProfile) -> None:
+        """事务提交后写入缓存，旧版本不会覆盖新版本"""
+        cached = self._cache.get(profile.userid)
+        if cached is None or cached.version <= profile.version:
+            self._cache[profile.userid] = profile
+            self._checked_at[profile.userid] = time.monotonic()
+            self._absent.pop(profile.userid, None)
+
+    def get(self, userid: str) -> Optional[UserProfile]:
+        """
+        读取画像：缓存未过期直接返回，过期后只在版本号变化时重新加载。
+        画像不存在或尚未回填时从图谱回填一次；图谱中也没有相关信息时记为“无画像”，
+        之后只检查其他进程是否已写入画像，不再重复回填（写入相关关系时update_in_tx会再次回填）。
+        """
+        now = time.monotonic()
+        cached = self._cache.get(userid)
+        if cached is not None and now - self._checked_at.get(userid, 0) < PROFILE_CACHE_TTL:
+            return cached
+        absent_at = self._absent.get(userid)
+        if absent_at is not None and now - absent_at < PROFILE_CACHE_TTL:
+            return None
+        try:
+            with self.driver.session() as session:
+                if cached is not None:
+                    record = session.run(
+                        "MATCH (p:UserProfile {userid: $userid}) RETURN p.version AS version",
+                        userid=userid
+                    ).single()
+                    if record is not None and record["version"] == cached.version:
+                        self._checked_at[userid] = now
+                        return cached
+                record = session.run(
+                    "MATCH (p:UserProfile {userid: $userid}) RETURN p.doc AS doc, p.version AS version",
+                    userid=userid
+                ).single()
+                profile = self._from_record(userid, record) if record is not None else None
+                if (profile is None or not profile.complete) and absent_at is None:
+                    profile = session.execute_write(
+                        lambda tx: self._update_in_tx(tx, userid, {}, [])
+                    )
+        except Exception as e:
+            self.logger.error(f"画像读取失败: {str(e)}")
+            return cached
+        if profile is None or not profile.complete:
+            self._absent[userid] = now
+            return None
+        self.cache(profile)
+        return self._cache[userid]
+
+    def _from_record(self, userid: str, record) -> UserProfile:
+        if record is None or not record["doc"]:
+            return UserProfile(userid=userid, version=record["version"] if record else 0)
+        try:
+            profile = UserProfile(**json.loads(record["doc"]))
+        except Exception as e:
+            self.logger.error(f"画像解析失败，将重新生成: {str(e)}")
+            profile = UserProfile(userid=userid)
+        profile.version = record["version"] or 0
+        return profile
+
+    @staticmethod
+    def _dump(profile: UserProfile) -> str:
+        return json.dumps(profile.dict(), ensure_ascii=False)
@@ -0,0 +1,138 @@
+# working_memory.py
+# 短期工作记忆：按会话保存最近几轮对话的实体、检索到的关系以及本次对话中新抽取的关系，
+# 用于在本地处理指代和追问（如“那她呢？”），未命中时才去查询图数据库
+from collections import OrderedDict, deque
+from typing import Iterable, List, Optional
+
+MAX_SESSIONS = 256  # 同时保留的会话数，超出时淘汰最久未使用的会话
+MAX_TURNS = 8  # 每个会话保留的最近轮数
+MAX_RETRIEVALS = 16  # 每个会话保留的图谱检索结果数
+MAX_FACTS_PER_RETRIEVAL = 50  # 与图谱查询的LIMIT一致
+MAX_SESSION_FACTS = 50  # 本次对话中新抽取的关系条数上限
+
+# 指代词：出现时把本轮实体解析为上一轮的实体
+PRONOUNS = ("她们", "他们", "它们", "她", "他", "它", "那个人", "这个人", "那里", "那边")
+# 含指代字但不是指代的常见词，匹配指代词前先去掉
+NON_PRONOUN_WORDS = ("其他", "其它", "吉他", "他人", "他乡", "他国", "利他", "排他", "它山", "无他")
+# 省略式追问（如“那我爸呢？”）的开头，以及不带开头时允许的最大长度
+FOLLOW_UP_PREFIXES = ("那么", "还有", "那")
+MAX_BARE_FOLLOW_UP_LEN = 4
+# 省略式追问中只换了“问什么”而没换“问谁”的词（如“那工作呢？”），此时沿用上一轮实体
+FIELD_WORDS = ("工作", "职业", "爱好", "兴趣", "住哪", "住址", "家", "年龄", "生日", "名字", "最近", "以前")
+
+
+class SessionMemory:
+    def __init__(self):
+        self.turns = deque(maxlen=MAX_TURNS)  # (问题, 解析出的实体列表)
+        self.retrievals = OrderedDict()  # frozenset(查询实体) -> 关系列表
+        self.session_facts = deque(maxlen=MAX_SESSION_FACTS)  # (主语, 关系, 宾语)
+
+    @property
+    def last_entities(self) -> List[str]:
+        return list(self.turns[-1][1]) if self.turns else []
+
+    @property
+    def last_question(self) -> Optional[str]:
+        return self.turns[-1][0] if self.turns else None
+
+    def add_turn(self, question: str, entities: List[str]) -> None:
+        self.turns.append((question, list(entities)))
+
+    def record_retrieval(self, entities: List[str], facts: List[str]) -> None:
+        key = frozenset(entities)
+        self.retrievals[key] = facts[:MAX_FACTS_PER_RETRIEVAL]
+        self.retrievals.move_to_end(key)
+        while len(self.retrievals) > MAX_RETRIEVALS:
+            self.retrievals.popitem(last=False)
+
+    def add_session_facts(self, relations: Iterable) -> None:
+        for r in relations:
+            self.session_facts.append((r.subject, r.relationship, r.object))
+
+    def lookup(self, entities: List[str]) -> Optional[List[str]]:
+        """查找覆盖全部实体的检索结果（检索时的实体集合包含本次实体即视为命中）"""
+        wanted = set(entities)
+        for key in reversed(self.retrievals):
+            if wanted <= key:
+                self.retrievals.move_to_end(key)
+                return self.retrievals[key]
+        return None
+
+    def session_facts_for(self, entities: List[str]) -> List[str]:
+        """本次对话中抽取到的、与实体相关的关系（可能尚未写入图数据库）"""
+        wanted = set(entities)
+        return [
+            f"{s} -[{rel.upper()}]-> {o} (本次对话)"
+            for s, rel, o in self.session_facts
+            if s in wanted or o in wanted
+        ]
+
+
+class WorkingMemory:
+    def __init__(self):
+        self._sessions = OrderedDict()  # 会话id -> SessionMemory
+
+    def session(self, session_id: str) -> SessionMemory:
+        """获取会话记忆，不存在则创建，并按最近使用顺序淘汰旧会话"""
+        if session_id not in self._sessions:
+            self._sessions[session_id] = SessionMemory()
+            while len(self._sessions) > MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        return self._sessions[session_id]
+
+    def clear(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+
+    @staticmethod
+    def has_pronoun(question: str) -> bool:
+        for word in NON_PRONOUN_WORDS:
+            question = question.replace(word, "")
+        return any(p in question for p in PRONOUNS)
+
+    @classmethod
+    def is_follow_up(cls, question: str) -> bool:
+        """
+        保守地判断是否为追问：包含指代词，或是“那……呢”这类很短的省略句。
+        误判会让问题绕过分析直接用上一轮的实体，所以宁可漏判。
+        """
+        stripped = question.strip().rstrip("？?！!。.~ ")
+        if cls.has_pronoun(stripped):
+            return True
+        return stripped.endswith("呢") and (
+            stripped.startswith(FOLLOW_UP_PREFIXES) or len(stripped) <= MAX_BARE_FOLLOW_UP_LEN
+        )
+
+    @staticmethod
+    def _asks_same_subject(question: str) -> bool:
+        """去掉开头和“呢”后为空或只剩字段词，说明追问对象没变；剩下其他词（如“小明”）则可能换了对象"""
+        rest = question.strip().rstrip("？?！!。.~ ")
+        for prefix in FOLLOW_UP_PREFIXES:
+            if rest.startswith(prefix):
+                rest = rest[len(prefix):]
+                break
+        if rest.endswith("呢"):
+            rest = rest[:-1]
+        rest = rest.strip("的 ")
+        return not rest or rest in FIELD_WORDS
+
+    def resolve_entities(self, session: SessionMemory, question: str,
+                         spotted: List[str], userid: str) -> Optional[List[str]]:
+        """
+        为追问解析目标实体：有指代词时沿用上一轮实体，否则使用词典匹配到的实体。
+        不是追问或无法解析时返回None，由调用方走完整的问题分析流程。
+        """
+        if not self.is_follow_up(question):
+            return None
+        last = session.last_entities
+        if self.has_pronoun(question) and last:
+            entities = last + [e for e in spotted if e not in last]
+        elif spotted:
+            entities = [userid] + [e for e in spotted if e != userid]
+        elif last and self._asks_same_subject(question):
+            entities = last
+        else:
+            return None
+        if userid not in entities:
+            entities.insert(0, userid)
+        return entities